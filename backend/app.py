@@ -1,44 +1,56 @@
 from fastapi import FastAPI, Query, HTTPException, Depends, status
 import models
+import rate_limit
 from sqlmodel import Session, select
 from typing import Annotated
 from logging.config import dictConfig
 import logging
 from app_logger import LogConfig
 from datetime import datetime, timezone, timedelta
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-import jwt
-from jwt.exceptions import InvalidTokenError
-from passlib.context import CryptContext
-from dotenv import load_dotenv
+from functools import lru_cache
 import os
 from pathlib import Path
 
+# passlib/bcrypt, jwt, dotenv and the export module are imported on first use rather than at module load
+# so workers come up quickly; nothing before the first authenticated request needs them
 dictConfig(LogConfig().dict())
 logger = logging.getLogger("manga_manager")
-dotenv_path = Path('MALlists.env')
-load_dotenv(dotenv_path=dotenv_path)
-SECRET_KEY: str = os.getenv('SECRET_KEY')
-ALGORITHM: str = os.getenv('ALGORITHM')
 ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 app = FastAPI()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
+@lru_cache
+def get_settings() -> dict:
+    from dotenv import load_dotenv
+    dotenv_path = Path('MALlists.env')
+    load_dotenv(dotenv_path=dotenv_path)
+    return {"SECRET_KEY": os.getenv('SECRET_KEY'), "ALGORITHM": os.getenv('ALGORITHM')}
+
+
+@lru_cache
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
 @app.on_event("startup")
 def startup():
-    models.create_db_and_tables()
+    # the env file also carries the rate limit overrides, so load it before validating them
+    get_settings()
+    rate_limit.configure()
+    models.ensure_schema()
 
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def get_user(username: str):
@@ -66,7 +78,9 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    import jwt
+    settings = get_settings()
+    encoded_jwt = jwt.encode(to_encode, settings["SECRET_KEY"], algorithm=settings["ALGORITHM"])
     return encoded_jwt
 
 
@@ -76,13 +90,15 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    import jwt
+    settings = get_settings()
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, settings["SECRET_KEY"], algorithms=[settings["ALGORITHM"]])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
         token_data = models.TokenData(username=username)
-    except InvalidTokenError:
+    except jwt.InvalidTokenError:
         raise credentials_exception
     user = get_user(username=token_data.username)
     if user is None:
@@ -98,6 +114,30 @@ async def get_current_active_user(
     return current_user
 
 
+def rate_limited(route: str):
+    async def check_rate_limit(current_user: Annotated[models.User, Depends(get_current_active_user)]):
+        rate_limit.get_rate_limiter(route).hit(current_user.username)
+        return current_user
+
+    return check_rate_limit
+
+
+def expensive_rate_limited(route: str):
+    check_rate_limit = rate_limited(route)
+
+    # the shared slot is only taken once the user is authenticated and within their own limit, so a
+    # client hammering the route gets its own 429 instead of crowding everyone else out of the pool
+    def acquire_expensive_slot(current_user: Annotated[models.User, Depends(check_rate_limit)]):
+        expensive = rate_limit.get_expensive_limiter()
+        expensive.acquire()
+        try:
+            yield current_user
+        finally:
+            expensive.release()
+
+    return acquire_expensive_slot
+
+
 def create_user(username: str, password: str, full_name: str):
     with Session(models.engine) as session:
         hashedpass = get_password_hash(password)
@@ -131,8 +171,13 @@ async def read_users_me(
     return current_user
 
 
+@app.get("/metrics")
+def get_metrics(current_user: Annotated[models.User, Depends(get_current_active_user)]):
+    return rate_limit.metrics()
+
+
 @app.get("/mangamanager/lists/all")
-def all_mangalists(current_user: Annotated[models.User, Depends(get_current_active_user)]):
+def all_mangalists(current_user: Annotated[models.User, Depends(expensive_rate_limited("lists_all"))]):
     with Session(models.engine) as session:
         statement = select(models.ReadingLists).where(models.ReadingLists.user_id == current_user.id)
         all_lists = session.exec(statement)
@@ -184,6 +229,26 @@ def ptr_mangalist(current_user: Annotated[models.User, Depends(get_current_activ
         return ptr_list.all()
 
 
+@app.get("/mangamanager/export/{table}")
+def export_table(table: models.ExportTable,
+                 current_user: Annotated[models.User, Depends(rate_limited("export"))],
+                 export_format: models.ExportFormat = models.ExportFormat.ndjson,
+                 compress: Annotated[bool, Query(description="gzip the response on the fly")] = False):
+    import export_lists
+    try:
+        stream = export_lists.export_stream(table, export_format, current_user, compress)
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    # the slot is held until the body has been streamed, not just until this function returns
+    expensive = rate_limit.get_expensive_limiter()
+    expensive.acquire()
+    stream = expensive.guard_stream(stream)
+    filename = export_lists.export_filename(table, export_format, compress)
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    media_type = "application/gzip" if compress else export_lists.MEDIA_TYPES[export_format]
+    return StreamingResponse(stream, media_type=media_type, headers=headers)
+
+
 @app.get("/mangamanager/manga_info/mark_total")
 def get_mark_total(mark_type: models.MarkType, manga_title_eng: Annotated[str,
 Query(description="manga title is case sensitive")],
@@ -245,7 +310,8 @@ def get_manga_id(manga_title_eng: str):
         return manga.first()
 
 
-@app.patch("/mangamanager/update/update_read_status", response_model=models.ReadUpdate)
+@app.patch("/mangamanager/update/update_read_status", response_model=models.ReadUpdate,
+           dependencies=[Depends(rate_limited("update"))])
 def update_mark_status(mark_type: models.MarkType, manga_title_eng: str, update_type: models.UpdateType):
     with (Session(models.engine) as session):
         series = get_all_manga_info(manga_title_eng)
@@ -319,7 +385,8 @@ def update_mark_status(mark_type: models.MarkType, manga_title_eng: str, update_
         return series
 
 
-@app.patch("/mangamanager/update/update_rating", response_model=models.ScoreUpdate)
+@app.patch("/mangamanager/update/update_rating", response_model=models.ScoreUpdate,
+           dependencies=[Depends(rate_limited("update"))])
 def update_rating(manga_title_eng: str, new_rating: int):
     with (Session(models.engine) as session):
         series = get_all_manga_info(manga_title_eng)
@@ -336,7 +403,8 @@ def update_rating(manga_title_eng: str, new_rating: int):
             return series
 
 
-@app.patch("/mangamanager/update/update_status", response_model=models.StatusUpdate)
+@app.patch("/mangamanager/update/update_status", response_model=models.StatusUpdate,
+           dependencies=[Depends(rate_limited("update"))])
 def update_status(manga_title_eng: str, new_status: int):
     with (Session(models.engine) as session):
         series = get_all_manga_info(manga_title_eng)
@@ -356,7 +424,8 @@ def update_status(manga_title_eng: str, new_status: int):
             return series
 
 
-@app.post("/mangamanager/update/read_log", response_model=models.ReadingLog)
+@app.post("/mangamanager/update/read_log", response_model=models.ReadingLog,
+          dependencies=[Depends(rate_limited("update"))])
 def update_read_log(user_id: int, readinglists_id: int, mark_type: models.MarkType, update_type: models.UpdateType,
                     mark_value: int):
     with (Session(models.engine) as session):
@@ -10,7 +10,6 @@ class LogConfig(BaseModel):
     LOG_LEVEL: str = "INFO"
     parent_dir: str = Path(__file__).parent
     LOG_FILE: str = f"{parent_dir}/app.log"
-    print(LOG_FILE)
 
     # Logging config
     version: int = 1
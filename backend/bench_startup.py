@@ -0,0 +1,109 @@
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import jwt
+
+# Measures time-to-first-request for a fresh uvicorn worker, from launch until it answers:
+#  - ready: GET /metrics without a token, which OAuth2PasswordBearer rejects with a 401 as soon as
+#    startup has finished
+#  - authenticated: the same request right after, with a signed bearer token for a user that doesn't
+#    exist, so the first real request pays for the deferred dotenv load, jwt import/decode and user lookup
+# The first run boots against an empty database (schema gets created), the rest reuse it, which is
+# the common case when workers are restarted. The budget applies to the median authenticated time.
+
+BACKEND_DIR = Path(__file__).parent
+DEFAULT_BUDGET_SECONDS = 2.0
+DEFAULT_RUNS = 5
+BENCH_SECRET_KEY = "startup-benchmark"
+BENCH_ALGORITHM = "HS256"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def answered(url: str, token: str | None = None) -> bool:
+    # any HTTP response, including the expected 401, means the worker handled the request
+    request = urllib.request.Request(url, headers={"Authorization": f"Bearer {token}"} if token else {})
+    try:
+        with urllib.request.urlopen(request, timeout=1):
+            return True
+    except urllib.error.HTTPError:
+        return True
+    except (urllib.error.URLError, ConnectionError):
+        return False
+
+
+def time_to_first_request(workdir: str, timeout: float) -> tuple[float, float]:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/metrics"
+    token = jwt.encode({"sub": "startup-benchmark"}, BENCH_SECRET_KEY, algorithm=BENCH_ALGORITHM)
+    # stderr goes to a file rather than a pipe so a chatty server can't block on a full pipe buffer
+    stderr = tempfile.TemporaryFile()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--app-dir", str(BACKEND_DIR), "--port", str(port),
+         "--log-level", "warning"],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=stderr,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                stderr.seek(0)
+                output = stderr.read().decode(errors="replace")
+                raise RuntimeError(f"server exited with code {server.returncode} before answering:\n{output}")
+            if answered(url):
+                ready = time.perf_counter() - start
+                if not answered(url, token):
+                    raise RuntimeError("server stopped answering after startup")
+                return ready, time.perf_counter() - start
+            time.sleep(0.01)
+        raise RuntimeError(f"server did not answer within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+        stderr.close()
+
+
+def run_benchmark(runs: int, timeout: float) -> tuple[tuple[float, float], list[tuple[float, float]]]:
+    with tempfile.TemporaryDirectory() as workdir:
+        # the app reads its settings from MALlists.env in the working directory
+        Path(workdir, "MALlists.env").write_text(f"SECRET_KEY={BENCH_SECRET_KEY}\nALGORITHM={BENCH_ALGORITHM}\n")
+        cold = time_to_first_request(workdir, timeout)
+        warm = [time_to_first_request(workdir, timeout) for _ in range(runs)]
+    return cold, warm
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark worker time-to-first-request")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET", DEFAULT_BUDGET_SECONDS)),
+                        help="maximum median seconds to the first authenticated request")
+    args = parser.parse_args()
+
+    cold, warm = run_benchmark(args.runs, timeout=args.budget * 10)
+    print(f"empty database: ready {cold[0]:.3f}s, authenticated {cold[1]:.3f}s")
+    ready = statistics.median(run[0] for run in warm)
+    authenticated = statistics.median(run[1] for run in warm)
+    print(f"existing database: median ready {ready:.3f}s, authenticated {authenticated:.3f}s over {args.runs} runs")
+
+    if authenticated > args.budget:
+        print(f"FAIL: median time to first authenticated request {authenticated:.3f}s "
+              f"exceeds budget {args.budget:.3f}s")
+        sys.exit(1)
+    print(f"OK: within budget {args.budget:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
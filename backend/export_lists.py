@@ -0,0 +1,222 @@
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import timezone
+from typing import Iterator
+from xml.sax.saxutils import escape
+
+from sqlmodel import Session, select
+
+import models
+
+# rows fetched per round trip; every chunk runs in its own short read transaction so a long export
+# never holds the SQLite shared lock long enough to block writers
+CHUNK_SIZE = 500
+
+EXPORT_MODELS = {
+    models.ExportTable.readinglists: models.ReadingLists,
+    models.ExportTable.readinglog: models.ReadingLog,
+}
+
+MEDIA_TYPES = {
+    models.ExportFormat.ndjson: "application/x-ndjson",
+    models.ExportFormat.csv: "text/csv",
+    models.ExportFormat.mal_json: "application/json",
+    models.ExportFormat.mal_xml: "application/xml",
+}
+
+FILE_EXTENSIONS = {
+    models.ExportFormat.ndjson: "ndjson",
+    models.ExportFormat.csv: "csv",
+    models.ExportFormat.mal_json: "json",
+    models.ExportFormat.mal_xml: "xml",
+}
+
+# MAL status codes as used by the load.json lists, mapped to the names used in MAL's XML export
+MAL_STATUS_NAMES = {
+    1: "Reading",
+    2: "Completed",
+    3: "On-Hold",
+    4: "Dropped",
+    6: "Plan to Read",
+}
+
+
+def iter_chunks(table: models.ExportTable, user_id: int, chunk_size: int = CHUNK_SIZE) -> Iterator[list]:
+    # keyset pagination on the primary key: memory stays bounded by chunk_size and each session is
+    # closed (ending its read transaction) before the chunk is handed to the encoder
+    model = EXPORT_MODELS[table]
+    last_id = 0
+    while True:
+        with Session(models.engine) as session:
+            statement = (select(model).where(model.user_id == user_id).where(model.id > last_id)
+                         .order_by(model.id).limit(chunk_size))
+            chunk = session.exec(statement).all()
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1].id
+
+
+def to_mal_json(row: models.ReadingLists) -> dict:
+    # same keys as the MAL load.json lists read by import_lists_json.py
+    created_at = row.added_date
+    if created_at is not None and created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return {
+        "status": row.status,
+        "score": row.score or 0,
+        "num_read_chapters": row.chapters_read or 0,
+        "num_read_volumes": row.volumes_read or 0,
+        # null when there's no added date; import_lists_json.py reads that back as None
+        "created_at": int(created_at.timestamp()) if created_at is not None else None,
+        "manga_title": row.manga_title,
+        "manga_english": row.manga_title_eng,
+        "manga_num_chapters": row.chapters_total or 0,
+        "manga_num_volumes": row.volumes_total or 0,
+        "manga_publishing_status": row.manga_pub_status,
+        "manga_id": row.mal_manga_id,
+        "manga_url": row.manga_url,
+        "manga_image_path": row.manga_img_path,
+    }
+
+
+def to_mal_xml(row: models.ReadingLists) -> str:
+    def fmt_date(value):
+        return value.strftime("%Y-%m-%d") if value is not None else "0000-00-00"
+
+    fields = [
+        ("manga_mangadb_id", row.mal_manga_id),
+        ("manga_title", escape(row.manga_title)),
+        ("manga_volumes", row.volumes_total or 0),
+        ("manga_chapters", row.chapters_total or 0),
+        ("my_read_volumes", row.volumes_read or 0),
+        ("my_read_chapters", row.chapters_read or 0),
+        ("my_start_date", fmt_date(row.reading_start_date)),
+        ("my_finish_date", fmt_date(row.reading_finished_date)),
+        ("my_score", row.score or 0),
+        ("my_status", escape(MAL_STATUS_NAMES.get(row.status, ""))),
+        ("update_on_import", 0),
+    ]
+    body = "".join(f"\t\t<{tag}>{value}</{tag}>\n" for tag, value in fields)
+    return f"\t<manga>\n{body}\t</manga>\n"
+
+
+def to_record(row, fields: list[str]) -> dict:
+    # model_dump on ORM-loaded rows follows attribute load order, so rebuild it in model field order
+    data = row.model_dump(mode="json")
+    return {field: data.get(field) for field in fields}
+
+
+def encode_ndjson(chunks: Iterator[list], table: models.ExportTable) -> Iterator[str]:
+    fields = list(EXPORT_MODELS[table].model_fields)
+    for chunk in chunks:
+        yield "".join(json.dumps(to_record(row, fields), ensure_ascii=False) + "\n" for row in chunk)
+
+
+def encode_csv(chunks: Iterator[list], table: models.ExportTable) -> Iterator[str]:
+    fields = list(EXPORT_MODELS[table].model_fields)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    for chunk in chunks:
+        writer.writerows(to_record(row, fields) for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def encode_mal_json(chunks: Iterator[list]) -> Iterator[str]:
+    yield "["
+    first = True
+    for chunk in chunks:
+        items = ",".join(json.dumps(to_mal_json(row), ensure_ascii=False) for row in chunk)
+        yield items if first else "," + items
+        first = False
+    yield "]"
+
+
+def encode_mal_xml(chunks: Iterator[list], username: str) -> Iterator[str]:
+    yield ('<?xml version="1.0" encoding="UTF-8" ?>\n<myanimelist>\n\t<myinfo>\n'
+           f"\t\t<user_name>{escape(username)}</user_name>\n\t\t<user_export_type>2</user_export_type>\n"
+           "\t</myinfo>\n")
+    for chunk in chunks:
+        yield "".join(to_mal_xml(row) for row in chunk)
+    yield "</myanimelist>\n"
+
+
+def gzip_stream(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(table: models.ExportTable, export_format: models.ExportFormat, user: models.User,
+                  compress: bool = False, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    if table is not models.ExportTable.readinglists and export_format in (models.ExportFormat.mal_json,
+                                                                           models.ExportFormat.mal_xml):
+        raise ValueError(f"{export_format.value} export is only available for readinglists")
+    chunks = iter_chunks(table, user.id, chunk_size)
+    match export_format:
+        case models.ExportFormat.ndjson:
+            text_stream = encode_ndjson(chunks, table)
+        case models.ExportFormat.csv:
+            text_stream = encode_csv(chunks, table)
+        case models.ExportFormat.mal_json:
+            text_stream = encode_mal_json(chunks)
+        case models.ExportFormat.mal_xml:
+            text_stream = encode_mal_xml(chunks, user.username)
+    byte_stream = (text.encode("utf-8") for text in text_stream)
+    if compress:
+        return gzip_stream(byte_stream)
+    return byte_stream
+
+
+def export_filename(table: models.ExportTable, export_format: models.ExportFormat, compress: bool = False) -> str:
+    filename = f"{table.value}.{FILE_EXTENSIONS[export_format]}"
+    return f"{filename}.gz" if compress else filename
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a user's reading lists or reading log")
+    parser.add_argument("username")
+    parser.add_argument("--table", type=models.ExportTable, choices=list(models.ExportTable),
+                        default=models.ExportTable.readinglists)
+    parser.add_argument("--format", dest="export_format", type=models.ExportFormat,
+                        choices=list(models.ExportFormat), default=models.ExportFormat.ndjson)
+    parser.add_argument("--gzip", action="store_true", help="compress the output with gzip")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("-o", "--output", help="output file, defaults to stdout")
+    args = parser.parse_args()
+    # keep SQL echo out of the exported data when writing to stdout
+    models.engine.echo = False
+
+    with Session(models.engine) as session:
+        user = session.exec(select(models.User).where(models.User.username == args.username)).one_or_none()
+    if user is None:
+        parser.error(f"user {args.username} not found")
+
+    try:
+        stream = export_stream(args.table, args.export_format, user, args.gzip, args.chunk_size)
+    except ValueError as err:
+        parser.error(str(err))
+    if args.output:
+        with open(args.output, "wb") as file:
+            for data in stream:
+                file.write(data)
+    else:
+        for data in stream:
+            sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,21 @@ from datetime import datetime, timezone
 from models import ReadingLists
 
 
+def to_reading_list(i: dict, user_id: int = 1) -> ReadingLists:
+    # exports from this app write null for rows that never had an added date
+    created_at = None
+    if i.get("created_at") is not None:
+        created_at = datetime.fromtimestamp(int(i["created_at"]), tz=timezone.utc)
+    return ReadingLists(status=i["status"], user_id=user_id, score=i["score"], chapters_read=i["num_read_chapters"],
+                        volumes_read=i["num_read_volumes"], added_date=created_at,
+                        manga_title=i["manga_title"],
+                        manga_title_eng=i["manga_english"], chapters_total=i["manga_num_chapters"],
+                        volumes_total=i["manga_num_volumes"],
+                        manga_pub_status=i["manga_publishing_status"],
+                        mal_manga_id=i["manga_id"], manga_url=i["manga_url"],
+                        manga_img_path=i["manga_image_path"])
+
+
 def main():
     sqlite_file_name = "manga_manager.db"
     sqlite_url = f"sqlite:///{sqlite_file_name}"
@@ -16,17 +31,7 @@ def main():
         with open("MALlists/all_lists.json", 'r') as file:
             data = json.load(file)
             for i in data:
-                ts = int(i["created_at"])
-                created_at = datetime.fromtimestamp(ts, tz=timezone.utc)
-                manga_val = ReadingLists(status=i["status"], user_id=1, score=i["score"], chapters_read=i["num_read_chapters"],
-                                         volumes_read=i["num_read_volumes"], added_date=created_at,
-                                         manga_title=i["manga_title"],
-                                         manga_title_eng=i["manga_english"], chapters_total=i["manga_num_chapters"],
-                                         volumes_total=i["manga_num_volumes"],
-                                         manga_pub_status=i["manga_publishing_status"],
-                                         mal_manga_id=i["manga_id"], manga_url=i["manga_url"],
-                                         manga_img_path=i["manga_image_path"])
-
+                manga_val = to_reading_list(i)
                 session.add(manga_val)
         session.commit()
 
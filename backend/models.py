@@ -1,12 +1,13 @@
 from typing import Optional
 from datetime import datetime
 from enum import Enum
+from sqlalchemy import inspect
 from sqlmodel import SQLModel, Field, create_engine, TIMESTAMP, text, Column, FetchedValue
 
 
 class ReadingLists(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: Optional[int] = Field(default=None, foreign_key="User.id")
+    user_id: Optional[int] = Field(default=None, foreign_key="user.id")
     status: int = Field(nullable=False)
     score: Optional[int]
     chapters_read: Optional[int] = None
@@ -69,6 +70,18 @@ class UpdateType(str, Enum):
     unread = "unread"
 
 
+class ExportTable(str, Enum):
+    readinglists = "readinglists"
+    readinglog = "readinglog"
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+    mal_json = "mal_json"
+    mal_xml = "mal_xml"
+
+
 class ReadUpdate(MangaInfoId):
     chapters_read: int | None = None
     volumes_read: int | None = None
@@ -156,3 +169,45 @@ def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
 
 
+# Version 1 is the schema defined by the models above. When an existing table changes, bump SCHEMA_VERSION
+# and add the SQL that takes a version SCHEMA_VERSION - 1 database to the new version under MIGRATIONS.
+# create_all only ever adds missing tables, so brand new table models need a bump but no statements.
+SCHEMA_VERSION = 1
+MIGRATIONS: dict[int, list[str]] = {}
+
+
+def check_columns(conn):
+    inspector = inspect(conn)
+    missing = [f"{table.name}.{column.name}"
+               for table in SQLModel.metadata.sorted_tables
+               for column in table.columns
+               if column.name not in {c["name"] for c in inspector.get_columns(table.name)}]
+    if missing:
+        raise RuntimeError(f"database is missing columns {', '.join(missing)}; "
+                           f"add a migration for schema version {SCHEMA_VERSION}")
+
+
+def ensure_schema():
+    # the version is kept in SQLite's user_version header field, so an up to date database costs one
+    # pragma read at startup instead of reflecting every table
+    with engine.connect() as conn:
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+    if version == SCHEMA_VERSION:
+        return
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"database schema version {version} is newer than this app ({SCHEMA_VERSION})")
+    # version 0 is a new file or a database created before versioning, which only needs missing tables
+    # created; anything older than the current version needs every migration in between
+    steps = range(version + 1, SCHEMA_VERSION + 1) if version else range(0)
+    missing = [step for step in steps if step not in MIGRATIONS]
+    if missing:
+        raise RuntimeError(f"no migration from schema version {version} to {SCHEMA_VERSION} "
+                           f"(missing steps {missing})")
+    with engine.begin() as conn:
+        for step in steps:
+            for statement in MIGRATIONS[step]:
+                conn.exec_driver_sql(statement)
+        SQLModel.metadata.create_all(conn)
+        # only stamp the database once its tables really match the models
+        check_columns(conn)
+        conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
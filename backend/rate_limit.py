@@ -0,0 +1,206 @@
+import math
+import os
+import threading
+import time
+import weakref
+from typing import Iterator
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, Field, ValidationError
+
+
+class RouteLimit(BaseModel):
+    """Token bucket settings for one route: `rate` tokens refill per second up to `burst`"""
+
+    rate: float = Field(gt=0)
+    burst: int = Field(ge=1)
+
+
+# defaults per route, each can be overridden with RATE_LIMIT_<ROUTE>=rate,burst (e.g. RATE_LIMIT_LISTS_ALL=0.5,5)
+DEFAULT_ROUTE_LIMITS: dict[str, RouteLimit] = {
+    "lists_all": RouteLimit(rate=0.5, burst=5),
+    "update": RouteLimit(rate=2, burst=20),
+    "export": RouteLimit(rate=0.1, burst=2),
+}
+# requests allowed to run at once across all expensive routes, overridden with MAX_CONCURRENT_EXPENSIVE
+DEFAULT_MAX_CONCURRENT_EXPENSIVE = 4
+# seconds a client is told to wait when the expensive pool is full, overridden with EXPENSIVE_RETRY_AFTER
+DEFAULT_EXPENSIVE_RETRY_AFTER = 5
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        # returns 0 when a token was taken, otherwise the seconds until one is available
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    def __init__(self, name: str, limit: RouteLimit):
+        self.name = name
+        self.limit = limit
+        self.buckets: dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def hit(self, key: str):
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(self.limit.rate, self.limit.burst)
+            wait = bucket.take()
+            if wait:
+                self.rejected += 1
+            else:
+                self.allowed += 1
+        if wait:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"rate limit exceeded for {self.name}",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {"rate": self.limit.rate, "burst": self.limit.burst, "tracked_users": len(self.buckets),
+                    "allowed": self.allowed, "rejected": self.rejected}
+
+
+class ConcurrencyLimiter:
+    def __init__(self, name: str, limit: int, retry_after: int):
+        self.name = name
+        self.limit = limit
+        self.retry_after = retry_after
+        self.slots = threading.BoundedSemaphore(limit)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def acquire(self):
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"too many concurrent {self.name} requests",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        with self.lock:
+            self.in_flight += 1
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+        self.slots.release()
+
+    def guard_stream(self, stream: Iterator[bytes]) -> "GuardedStream":
+        return GuardedStream(self, stream)
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {"limit": self.limit, "in_flight": self.in_flight, "rejected": self.rejected}
+
+
+class GuardedStream:
+    """Iterator over a streaming response body that gives its concurrency slot back exactly once
+
+    Starlette drops the body iterator without starting it when the client disconnects early, so the
+    release can't live in a generator's finally. It runs when the body is exhausted or fails, on close(),
+    and from a weakref finalizer once the iterator is garbage collected.
+    """
+
+    def __init__(self, limiter: ConcurrencyLimiter, stream: Iterator[bytes]):
+        self.stream = stream
+        self.finalizer = weakref.finalize(self, limiter.release)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        try:
+            return next(self.stream)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self.finalizer.alive:
+            self.finalizer()
+            close_stream = getattr(self.stream, "close", None)
+            if close_stream is not None:
+                close_stream()
+
+
+def route_limit(route: str) -> RouteLimit:
+    limit = DEFAULT_ROUTE_LIMITS[route]
+    name = f"RATE_LIMIT_{route.upper()}"
+    override = os.getenv(name)
+    if override:
+        try:
+            rate, burst = override.split(",")
+            limit = RouteLimit(rate=rate, burst=burst)
+        except (ValueError, ValidationError) as err:
+            raise ValueError(f"{name}={override!r} must be 'rate,burst' with rate > 0 and burst >= 1") from err
+    return limit
+
+
+def env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise ValueError(f"{name}={value!r} must be a positive integer")
+    return number
+
+
+registry_lock = threading.Lock()
+rate_limiters: dict[str, RateLimiter] = {}
+expensive: ConcurrencyLimiter | None = None
+
+
+def configure():
+    # called from the app's startup hook so a bad override stops the worker from booting instead of
+    # turning every request to that route into a 500
+    global expensive
+    limits = {route: route_limit(route) for route in DEFAULT_ROUTE_LIMITS}
+    max_concurrent = env_int("MAX_CONCURRENT_EXPENSIVE", DEFAULT_MAX_CONCURRENT_EXPENSIVE)
+    retry_after = env_int("EXPENSIVE_RETRY_AFTER", DEFAULT_EXPENSIVE_RETRY_AFTER)
+    with registry_lock:
+        rate_limiters.clear()
+        rate_limiters.update({route: RateLimiter(route, limit) for route, limit in limits.items()})
+        expensive = ConcurrencyLimiter("expensive", max_concurrent, retry_after)
+
+
+def get_rate_limiter(route: str) -> RateLimiter:
+    if expensive is None:
+        configure()
+    return rate_limiters[route]
+
+
+def get_expensive_limiter() -> ConcurrencyLimiter:
+    if expensive is None:
+        configure()
+    return expensive
+
+
+def metrics() -> dict:
+    return {
+        "rate_limits": {name: limiter.metrics() for name, limiter in rate_limiters.items()},
+        "concurrency": {"expensive": get_expensive_limiter().metrics()},
+    }
@@ -0,0 +1,17 @@
+import os
+import statistics
+
+import pytest
+
+import bench_startup
+
+# boots several uvicorn workers, so it can be left out of quick runs with SKIP_STARTUP_BENCH=1
+pytestmark = pytest.mark.skipif(os.getenv("SKIP_STARTUP_BENCH") == "1", reason="SKIP_STARTUP_BENCH=1")
+
+BUDGET = float(os.getenv("STARTUP_BUDGET", bench_startup.DEFAULT_BUDGET_SECONDS))
+
+
+def test_time_to_first_request_within_budget():
+    cold, warm = bench_startup.run_benchmark(runs=3, timeout=BUDGET * 10)
+    assert all(ready <= authenticated for ready, authenticated in [cold, *warm])
+    assert statistics.median(authenticated for _, authenticated in warm) <= BUDGET
@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+import re
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session, create_engine
+
+import app as app_module
+import export_lists
+import import_lists_json
+import models
+
+READER = models.User(id=1, username="reader & <friends>", full_name="Reader", active=True, hashed_password="x")
+OTHER = models.User(id=2, username="other", full_name="Other", active=True, hashed_password="x")
+
+
+@pytest.fixture(autouse=True)
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'manga_manager.db'}", connect_args={"check_same_thread": False})
+    monkeypatch.setattr(models, "engine", engine)
+    models.create_db_and_tables()
+    with Session(engine) as session:
+        session.add(models.User.model_validate(READER))
+        session.add(models.User.model_validate(OTHER))
+        session.commit()
+    yield engine
+    engine.dispose()
+
+
+def add_manga(user: models.User, count: int, **fields):
+    with Session(models.engine) as session:
+        for n in range(count):
+            values = {"status": 1, "manga_title": f"{user.username} {n}", "manga_pub_status": 1,
+                      "mal_manga_id": 1000 + n} | fields
+            session.add(models.ReadingLists(user_id=user.id, **values))
+        session.commit()
+
+
+def export(table, export_format, user=READER, compress=False, chunk_size=export_lists.CHUNK_SIZE) -> bytes:
+    return b"".join(export_lists.export_stream(table, export_format, user, compress, chunk_size))
+
+
+def test_iter_chunks_crosses_chunk_boundaries():
+    add_manga(READER, 7)
+    chunks = list(export_lists.iter_chunks(models.ExportTable.readinglists, READER.id, chunk_size=3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    ids = [row.id for chunk in chunks for row in chunk]
+    assert ids == sorted(set(ids))
+    assert len(ids) == 7
+
+
+def test_export_excludes_other_users():
+    add_manga(OTHER, 2)
+    add_manga(READER, 3)
+    add_manga(OTHER, 1, manga_title="other late")
+    lines = export(models.ExportTable.readinglists, models.ExportFormat.ndjson, chunk_size=2).splitlines()
+    assert len(lines) == 3
+    assert {json.loads(line)["user_id"] for line in lines} == {READER.id}
+
+
+def test_ndjson_keys_follow_model_fields():
+    add_manga(READER, 3, score=7)
+    lines = export(models.ExportTable.readinglists, models.ExportFormat.ndjson, chunk_size=2).splitlines()
+    assert len(lines) == 3
+    assert all(list(json.loads(line)) == list(models.ReadingLists.model_fields) for line in lines)
+
+
+def test_csv_matches_model_fields():
+    add_manga(READER, 4)
+    rows = list(csv.reader(io.StringIO(
+        export(models.ExportTable.readinglists, models.ExportFormat.csv, chunk_size=3).decode())))
+    assert rows[0] == list(models.ReadingLists.model_fields)
+    assert len(rows) == 5
+    assert [row[rows[0].index("manga_title")] for row in rows[1:]] == [f"{READER.username} {n}" for n in range(4)]
+
+
+def test_empty_csv_still_has_header():
+    rows = list(csv.reader(io.StringIO(export(models.ExportTable.readinglog, models.ExportFormat.csv).decode())))
+    assert rows == [list(models.ReadingLog.model_fields)]
+
+
+@pytest.mark.parametrize("export_format", list(models.ExportFormat))
+def test_gzip_matches_uncompressed(export_format):
+    add_manga(READER, 5)
+    plain = export(models.ExportTable.readinglists, export_format, chunk_size=2)
+    compressed = export(models.ExportTable.readinglists, export_format, compress=True, chunk_size=2)
+    assert zlib.decompress(compressed, wbits=zlib.MAX_WBITS | 16) == plain
+
+
+@pytest.mark.parametrize("export_format", [models.ExportFormat.mal_json, models.ExportFormat.mal_xml])
+def test_mal_formats_reject_readinglog(export_format):
+    with pytest.raises(ValueError):
+        export_lists.export_stream(models.ExportTable.readinglog, export_format, READER)
+    with pytest.raises(HTTPException) as err:
+        app_module.export_table(models.ExportTable.readinglog, READER, export_format)
+    assert err.value.status_code == 400
+
+
+def test_mal_xml_escapes_title_and_username():
+    add_manga(READER, 1, manga_title="Kaguya & <Love> Is War")
+    xml = export(models.ExportTable.readinglists, models.ExportFormat.mal_xml).decode()
+    assert "<manga_title>Kaguya &amp; &lt;Love&gt; Is War</manga_title>" in xml
+    assert "<user_name>reader &amp; &lt;friends&gt;</user_name>" in xml
+
+
+def test_mal_json_has_importer_keys():
+    add_manga(READER, 2)
+    items = json.loads(export(models.ExportTable.readinglists, models.ExportFormat.mal_json, chunk_size=1))
+    source = (Path(__file__).parent / "import_lists_json.py").read_text()
+    imported_keys = set(re.findall(r'(?:\[|\.get\()"(\w+)"', source))
+    assert len(items) == 2
+    assert imported_keys
+    assert all(imported_keys <= item.keys() for item in items)
+
+
+def test_mal_json_round_trips_through_importer():
+    add_manga(READER, 1, manga_title="dated", added_date=datetime(2024, 5, 1, 12, 30), score=8,
+              chapters_read=12, chapters_total=40)
+    add_manga(READER, 1, manga_title="undated")
+    items = json.loads(export(models.ExportTable.readinglists, models.ExportFormat.mal_json))
+    assert items[1]["created_at"] is None
+    dated, undated = (import_lists_json.to_reading_list(item, user_id=READER.id) for item in items)
+    assert dated.added_date.replace(tzinfo=None) == datetime(2024, 5, 1, 12, 30)
+    assert (dated.manga_title, dated.score, dated.chapters_read, dated.chapters_total) == ("dated", 8, 12, 40)
+    assert undated.added_date is None
+    assert undated.manga_title == "undated"
@@ -0,0 +1,59 @@
+import pytest
+from sqlmodel import create_engine
+
+import models
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'manga_manager.db'}", connect_args={"check_same_thread": False})
+    monkeypatch.setattr(models, "engine", engine)
+    yield engine
+    engine.dispose()
+
+
+def user_version(engine) -> int:
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def test_new_database_is_created_and_stamped(engine):
+    models.ensure_schema()
+    assert user_version(engine) == models.SCHEMA_VERSION
+    # a second boot only reads the version
+    models.ensure_schema()
+
+
+def test_unversioned_database_missing_columns_is_not_stamped(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR)")
+    with pytest.raises(RuntimeError, match="user.hashed_password"):
+        models.ensure_schema()
+    assert user_version(engine) == 0
+
+
+def test_missing_migration_raises_without_stamping(engine, monkeypatch):
+    models.ensure_schema()
+    monkeypatch.setattr(models, "SCHEMA_VERSION", models.SCHEMA_VERSION + 1)
+    with pytest.raises(RuntimeError, match="no migration"):
+        models.ensure_schema()
+    assert user_version(engine) == models.SCHEMA_VERSION - 1
+
+
+def test_migrations_run_in_order(engine, monkeypatch):
+    models.ensure_schema()
+    start = models.SCHEMA_VERSION
+    monkeypatch.setattr(models, "SCHEMA_VERSION", start + 2)
+    monkeypatch.setattr(models, "MIGRATIONS", {
+        start + 1: ["ALTER TABLE user ADD COLUMN email VARCHAR"],
+        start + 2: ["UPDATE user SET email = ''"],
+    })
+    models.ensure_schema()
+    assert user_version(engine) == start + 2
+
+
+def test_newer_database_raises(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version = {models.SCHEMA_VERSION + 1}")
+    with pytest.raises(RuntimeError, match="newer"):
+        models.ensure_schema()
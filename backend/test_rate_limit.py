@@ -0,0 +1,149 @@
+import asyncio
+import gc
+
+import pytest
+from sqlmodel import create_engine
+
+import app as app_module
+import models
+import rate_limit
+
+READER = models.User(id=1, username="reader", full_name="Reader", active=True, hashed_password="unused")
+
+
+@pytest.fixture(autouse=True)
+def fresh_limits(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'manga_manager.db'}", connect_args={"check_same_thread": False})
+    monkeypatch.setattr(models, "engine", engine)
+    models.create_db_and_tables()
+    monkeypatch.setenv("MAX_CONCURRENT_EXPENSIVE", "2")
+    rate_limit.configure()
+    yield
+    app_module.app.dependency_overrides.clear()
+    engine.dispose()
+
+
+def login_as(user: models.User):
+    app_module.app.dependency_overrides[app_module.get_current_active_user] = lambda: user
+
+
+def call(path: str, disconnect: bool = False) -> dict:
+    # minimal ASGI client; with disconnect=True the client goes away before reading the body
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "", "headers": [],
+        "server": ("testserver", 80), "client": ("testclient", 1234),
+    }
+    messages = []
+
+    async def run():
+        request_sent = False
+        response_done = asyncio.Event()
+
+        async def receive():
+            nonlocal request_sent
+            if disconnect:
+                return {"type": "http.disconnect"}
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await response_done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_done.set()
+
+        await app_module.app(scope, receive, send)
+
+    asyncio.run(run())
+    start = next((m for m in messages if m["type"] == "http.response.start"), None)
+    return {"status": start["status"] if start else None,
+            "headers": dict(start["headers"]) if start else {}}
+
+
+def test_guarded_stream_releases_when_never_started():
+    limiter = rate_limit.ConcurrencyLimiter("test", 1, 1)
+    limiter.acquire()
+    stream = limiter.guard_stream(iter([b"data"]))
+    del stream
+    gc.collect()
+    assert limiter.metrics()["in_flight"] == 0
+    limiter.acquire()
+
+
+def test_guarded_stream_releases_once():
+    limiter = rate_limit.ConcurrencyLimiter("test", 1, 1)
+    limiter.acquire()
+    stream = limiter.guard_stream(iter([b"a", b"b"]))
+    assert list(stream) == [b"a", b"b"]
+    assert limiter.metrics()["in_flight"] == 0
+    # a second release would overflow the BoundedSemaphore and raise
+    stream.close()
+    del stream
+    gc.collect()
+    assert limiter.metrics()["in_flight"] == 0
+
+
+def test_export_disconnect_returns_slot(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_EXPORT", "1,100")
+    rate_limit.configure()
+    login_as(READER)
+    expensive = rate_limit.get_expensive_limiter()
+    for _ in range(expensive.limit + 2):
+        call("/mangamanager/export/readinglists", disconnect=True)
+        gc.collect()
+        assert expensive.metrics()["in_flight"] == 0
+    assert call("/mangamanager/export/readinglists")["status"] == 200
+
+
+def test_lists_all_checks_auth_before_taking_slot():
+    expensive = rate_limit.get_expensive_limiter()
+    for _ in range(expensive.limit):
+        expensive.acquire()
+    assert call("/mangamanager/lists/all")["status"] == 401
+
+
+def test_lists_all_checks_user_limit_before_taking_slot(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_LISTS_ALL", "0.001,1")
+    rate_limit.configure()
+    login_as(READER)
+    expensive = rate_limit.get_expensive_limiter()
+    for _ in range(expensive.limit):
+        expensive.acquire()
+    rate_limit.get_rate_limiter("lists_all").hit(READER.username)
+    response = call("/mangamanager/lists/all")
+    assert response["status"] == 429
+    assert b"retry-after" in response["headers"]
+
+
+def test_lists_all_sheds_when_pool_full():
+    login_as(READER)
+    expensive = rate_limit.get_expensive_limiter()
+    for _ in range(expensive.limit):
+        expensive.acquire()
+    response = call("/mangamanager/lists/all")
+    assert response["status"] == 503
+    assert response["headers"][b"retry-after"] == b"5"
+    expensive.release()
+    assert call("/mangamanager/lists/all")["status"] == 200
+
+
+@pytest.mark.parametrize("override", ["1", "fast,5", "0,5", "-1,5", "1,0"])
+def test_configure_rejects_bad_override(monkeypatch, override):
+    monkeypatch.setenv("RATE_LIMIT_UPDATE", override)
+    with pytest.raises(ValueError, match="RATE_LIMIT_UPDATE"):
+        rate_limit.configure()
+
+
+def test_configure_rejects_bad_concurrency(monkeypatch):
+    monkeypatch.setenv("MAX_CONCURRENT_EXPENSIVE", "none")
+    with pytest.raises(ValueError, match="MAX_CONCURRENT_EXPENSIVE"):
+        rate_limit.configure()
+
+
+def test_metrics_requires_auth():
+    assert call("/metrics")["status"] == 401
+    login_as(READER)
+    assert call("/metrics")["status"] == 200